@@ -0,0 +1,258 @@
+# Copyright © 2015-2018 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+"""
+A minimal replacement for the parts of r.js, that are needed for creating
+unminified bundles: naming anonymous modules and ordering them by their
+dependencies.
+"""
+
+import json
+import posixpath
+import re
+
+
+_token_regex = re.compile(r"""
+    (?P<comment>//[^\n]*|/\*.*?(?:\*/|$))
+  | (?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+  | (?P<template>`(?:[^`\\]|\\.)*`)
+  | (?P<slash>/)
+""", re.DOTALL | re.VERBOSE)
+_regex_literal_regex = re.compile(
+    r'/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[A-Za-z]*')
+_word_regex = re.compile(r'[\w$]+$')
+
+# keywords after which a slash starts a regular expression literal
+_regex_keywords = {
+    'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void',
+    'throw', 'case', 'do', 'else', 'yield', 'await',
+}
+
+_define_regex = re.compile(r'(?<![\w$.])define\s*\(\s*')
+_function_declaration_regex = re.compile(r'function\s*$')
+_comma_regex = re.compile(r'\s*,\s*')
+_factory_regex = re.compile(
+    r'function\b\s*[\w$]*\s*\((?P<params>[^)]*)\)\s*\{')
+_require_regex = re.compile(r'(?<![\w$.])require\s*\(\s*')
+_closing_paren_regex = re.compile(r'\s*\)')
+
+
+def make_header(name):
+    return \
+        '//---{sep}----//\n' \
+        '//  {name}.js  //\n' \
+        '//---{sep}----//\n' \
+        .format(name=name, sep=('-' * len(name)))
+
+
+def _regex_allowed(code):
+    """
+    Whether a slash following given *code* would start a regular expression
+    literal (as opposed to being a division operator).
+    """
+    code = code.rstrip()
+    if not code:
+        return None
+    if code[-1] in ')]':
+        return False
+    word = _word_regex.search(code)
+    if word:
+        return word.group(0) in _regex_keywords
+    return True
+
+
+def _mask(content):
+    """
+    Returns a copy of *content* of the same length, where comments and the
+    contents of string, template and regular expression literals have been
+    replaced by spaces, and a dict mapping the start offset of each string
+    literal to its value.
+    """
+    masked = []
+    strings = {}
+    regex_allowed = True
+    pos = 0
+    while True:
+        match = _token_regex.search(content, pos)
+        if not match:
+            masked.append(content[pos:])
+            break
+        code = content[pos:match.start()]
+        masked.append(code)
+        allowed = _regex_allowed(code)
+        if allowed is not None:
+            regex_allowed = allowed
+        token = match.group(0)
+        if match.group('comment'):
+            masked.append(' ' * len(token))
+        elif match.group('string') or match.group('template'):
+            strings[match.start()] = token[1:-1]
+            masked.append(token[0] + ' ' * (len(token) - 2) + token[-1])
+            regex_allowed = False
+        else:
+            regex = regex_allowed and \
+                _regex_literal_regex.match(content, match.start())
+            if regex:
+                token = regex.group(0)
+                masked.append(' ' * len(token))
+                regex_allowed = False
+            else:
+                masked.append(token)
+                regex_allowed = True
+        pos = match.start() + len(token)
+    return ''.join(masked), strings
+
+
+def _matching_brace(code, start):
+    depth = 0
+    for pos in range(start, len(code)):
+        if code[pos] == '{':
+            depth += 1
+        elif code[pos] == '}':
+            depth -= 1
+            if not depth:
+                return pos
+    return len(code)
+
+
+def _find_dependencies(code, strings, start):
+    """
+    Extracts the dependencies of a definition, whose arguments after the
+    module name begin at offset *start*: either the literal dependency array,
+    or the ``require()`` calls inside a factory function accepting arguments.
+    """
+    if code.startswith('[', start):
+        end = code.find(']', start)
+        return [value for offset, value in sorted(strings.items())
+                if start < offset < end]
+    factory = _factory_regex.match(code, start)
+    if not factory or not factory.group('params').strip():
+        return []
+    end = _matching_brace(code, factory.end() - 1)
+    dependencies = []
+    for call in _require_regex.finditer(code, factory.end(), end):
+        if call.end() not in strings:
+            continue
+        value = strings[call.end()]
+        if _closing_paren_regex.match(code, call.end() + len(value) + 2):
+            dependencies.append(value)
+    return dependencies
+
+
+def _shim_definition(name, shim):
+    if isinstance(shim, list):
+        shim = {'deps': shim}
+    deps = list(shim.get('deps', []))
+    if shim.get('exports'):
+        factory = \
+            '(function (global) {\n' \
+            '    return function () {\n' \
+            '        return global.%s;\n' \
+            '    };\n' \
+            '}(this))' % shim['exports']
+    else:
+        factory = 'function(){}'
+    definition = '\ndefine(%s, %s, %s);\n' % (
+        json.dumps(name), json.dumps(deps), factory)
+    return definition, deps
+
+
+def transform(name, content, shim=None):
+    """
+    Inserts the given module *name* into the first anonymous ``define()``
+    call in *content*, the same way r.js would. Returns a tuple consisting of
+    the transformed content and the list of dependencies found in the
+    definition. Comments, string literals and regular expressions are
+    ignored while searching for the definition.
+
+    Files without any definition of the module receive an empty ``define()``
+    call at the end, so that they can be required like any other module. If
+    a requirejs *shim* configuration is given for such a file, the appended
+    definition depends on the shim's ``deps`` and returns its ``exports``.
+    """
+    code, strings = _mask(content)
+    for match in _define_regex.finditer(code):
+        if _function_declaration_regex.search(code, 0, match.start()):
+            continue
+        start = match.end()
+        if start in strings:
+            if strings[start] != name:
+                continue
+            comma = _comma_regex.match(code, start + len(name) + 2)
+            if not comma:
+                continue
+            return content, _find_dependencies(code, strings, comma.end())
+        if code.startswith(')', start):
+            continue
+        dependencies = _find_dependencies(code, strings, start)
+        content = '%s%s, %s' % (
+            content[:start], json.dumps(name), content[start:])
+        return content, dependencies
+    if shim is not None:
+        definition, dependencies = _shim_definition(name, shim)
+        return content + definition, dependencies
+    content += '\ndefine(%s, function(){});\n' % json.dumps(name)
+    return content, []
+
+
+def resolve(name, dependency, map_={}):
+    """
+    Converts a *dependency* of module *name* into an absolute module name,
+    taking relative names and the requirejs ``map`` configuration into
+    account.
+    """
+    if '!' in dependency:
+        dependency = dependency.split('!', 1)[0]
+    if dependency.startswith('./') or dependency.startswith('../'):
+        dependency = posixpath.normpath(
+            posixpath.join(posixpath.dirname(name), dependency))
+    for key in (name, '*'):
+        if dependency in map_.get(key, {}):
+            return map_[key][dependency]
+    return dependency
+
+
+def sort(dependencies):
+    """
+    Orders the modules in the *dependencies* mapping (module name -> list of
+    resolved dependency names), so that each module comes after its
+    dependencies. Modules are otherwise processed in alphabetical order,
+    circular dependencies are broken at the first module encountered.
+    """
+    result = []
+    visited = set()
+
+    def visit(name):
+        if name in visited or name not in dependencies:
+            return
+        visited.add(name)
+        for dep in dependencies[name]:
+            visit(dep)
+        result.append(name)
+
+    for name in sorted(dependencies):
+        visit(name)
+    return result
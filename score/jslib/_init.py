@@ -24,7 +24,10 @@
 # the discretion of STRG.AT GmbH also the competent court, in whose district the
 # Licensee has his registered seat, an establishment or assets.
 
-from score.init import ConfiguredModule, ConfigurationError, parse_json
+from score.init import (
+    ConfiguredModule, ConfigurationError, parse_json, parse_time_interval)
+from ._metacache import MetadataCache
+from . import _bundle
 import collections
 import urllib.request
 import json
@@ -33,7 +36,6 @@ from tarfile import TarFile
 from io import BytesIO
 import re
 import tempfile
-import time
 import subprocess
 import hashlib
 
@@ -42,9 +44,17 @@ defaults = {
     'cachedir': None,
     'rootdir': None,
     'config': collections.OrderedDict(baseUrl='/js/'),
+    'meta.ttl': '1h',
+    'meta.stale': '0',
+    'meta.maxentries': None,
+    'meta.maxsize': None,
 }
 
 
+# matches absolute URLs, protocol-relative URLs and absolute paths
+_url_regex = re.compile(r'^(?:[a-zA-Z][a-zA-Z0-9+.-]*:|/)')
+
+
 def _merge_conf(dst, src):
     for k, v in src.items():
         if isinstance(v, dict):
@@ -58,10 +68,48 @@ def _merge_conf(dst, src):
     return dst
 
 
+def _rjs_paths(paths, include, userpaths):
+    """
+    Merges the configured requirejs *userpaths* into the *paths* of the
+    local modules for r.js. Local files always take precedence. Configured
+    URLs are excluded from the build, relative paths are resolved by r.js
+    against the `baseUrl`, just like the browser would.
+    """
+    result = collections.OrderedDict()
+    for key, value in userpaths.items():
+        if any(name == key or name.startswith(key + '/')
+               for name in include):
+            continue
+        if isinstance(value, list):
+            # r.js does not support fallback paths, use the first one
+            value = value[0]
+        if _url_regex.match(value):
+            value = 'empty:'
+        result[key] = value
+    result.update(paths)
+    return result
+
+
 def init(confdict, js=None):
     """
     Initializes this module acoording to the :ref:`SCORE module initialization
     guidelines <module_initialization>` with the following configuration keys:
+
+    :confkey:`meta.ttl` :confdefault:`1h`
+        Time interval, for which the cached metadata of the latest version of
+        an npm package is considered up-to-date.
+
+    :confkey:`meta.stale` :confdefault:`0`
+        Additional time interval, during which outdated metadata is still
+        returned, while it is being refreshed in the background.
+
+    :confkey:`meta.maxentries` :confdefault:`None`
+        Maximum number of package documents to keep in the metadata cache.
+        The least recently used entries are removed first.
+
+    :confkey:`meta.maxsize` :confdefault:`None`
+        Maximum size of all package documents in the metadata cache in bytes.
+        The least recently used entries are removed first.
     """
     conf = defaults.copy()
     conf.update(confdict)
@@ -75,6 +123,16 @@ def init(confdict, js=None):
     else:
         cachedir = os.path.join(tempfile.gettempdir(), 'score', 'jslib')
         os.makedirs(cachedir, exist_ok=True)
+    metacache_kwargs = {
+        'ttl': parse_time_interval(conf['meta.ttl']),
+        'stale': parse_time_interval(conf['meta.stale']),
+        'maxentries': None,
+        'maxsize': None,
+    }
+    if conf['meta.maxentries']:
+        metacache_kwargs['maxentries'] = int(conf['meta.maxentries'])
+    if conf['meta.maxsize']:
+        metacache_kwargs['maxsize'] = int(conf['meta.maxsize'])
     rootdir = None
     if js:
         rootdir = js.rootdir
@@ -101,17 +159,21 @@ def init(confdict, js=None):
         _merge_conf(overrides, parse_json(conf['config']))
     elif 'urlbase' in conf:
         overrides['baseUrl'] = conf['urlbase']
-    return ConfiguredScoreJslibModule(js, rootdir, cachedir, overrides)
+    return ConfiguredScoreJslibModule(
+        js, rootdir, cachedir, overrides, metacache_kwargs)
 
 
 class ConfiguredScoreJslibModule(ConfiguredModule):
 
-    def __init__(self, js, rootdir, cachedir, config_overrides):
+    def __init__(self, js, rootdir, cachedir, config_overrides,
+                 metacache_kwargs=None):
         import score.jslib
         super().__init__(score.jslib)
         self.js = js
         self.rootdir = rootdir
         self.cachedir = cachedir
+        self.metacache_kwargs = metacache_kwargs or {}
+        self.__metacache = None
         self.virtlibs = []
         self.config_overrides = config_overrides
         self.__requirejs_config = None
@@ -216,6 +278,14 @@ class ConfiguredScoreJslibModule(ConfiguredModule):
             self.__requirejs_config = conf
         return self.__requirejs_config
 
+    @property
+    def metacache(self):
+        if self.__metacache is None:
+            self.__metacache = MetadataCache(
+                os.path.join(self.cachedir, 'meta.sqlite3'),
+                self._fetch_package_json, **self.metacache_kwargs)
+        return self.__metacache
+
     def missing_dependencies(self):
         conf = self.requirejs_config
         missing = []
@@ -275,54 +345,142 @@ class ConfiguredScoreJslibModule(ConfiguredModule):
         yield from self.virtlibs
 
     def make_bundle(self, ctx=None, *, minify=True):
-        files = collections.OrderedDict(_almond=self.render_almondjs())
-        for path in self.traverse():
-            name = re.sub(r'\.js(\..+)?$', '', path)
-            if self.js:
-                content = self.js.tpl.renderer.render_file(ctx, path)
-            else:
-                filepath = os.path.join(self.rootdir, path)
-                content = open(filepath).read()
-            header = \
-                '//---{sep}----//\n' \
-                '//  {name}.js  //\n' \
-                '//---{sep}----//\n' \
-                .format(name=name, sep=('-' * len(name)))
-            files[name] = header + '\n' + content
-        conf = _merge_conf({
-            "rawText": files,
-            "out": "stdout",
-            "optimize": "uglify" if minify else "none",
-            "include": list(sorted(files.keys())),
-        }, self.requirejs_config)
-        conf["baseUrl"] = self.rootdir
-        script = r'''
-            require("requirejs").optimize(%s, function (result) {
-                console.warn(result);
-            }, function(err) {
-                console.warn(err);
-                process.exit(1);
-            });
-        ''' % json.dumps(conf)
-        process = subprocess.Popen(['node'],
-                                   stdin=subprocess.PIPE,
-                                   stdout=subprocess.PIPE,
-                                   stderr=subprocess.PIPE)
-        stdout, stderr = process.communicate(script.encode('UTF-8'))
-        stdout, stderr = str(stdout, 'UTF-8'), str(stderr, 'UTF-8')
-        if process.returncode:
-            self.log.error(stderr)
-            try:
-                raise subprocess.CalledProcessError(
-                    process.returncode, 'node', output=stdout, stderr=stderr)
-            except TypeError:
-                # the stderr kwarg is only available in python 3.5
-                pass
-            raise subprocess.CalledProcessError(
-                process.returncode, 'node', output=stderr)
-        if stderr:
-            self.log.info("r.js output:\n" + stderr)
-        return (stdout + self.render_requirejs_config())
+        return ''.join(self.iter_bundle(ctx, minify=minify))
+
+    def write_bundle(self, file, ctx=None, *, minify=True):
+        """
+        Writes the bundle to given *file* object chunk by chunk.
+        """
+        for chunk in self.iter_bundle(ctx, minify=minify):
+            file.write(chunk)
+
+    def iter_bundle(self, ctx=None, *, minify=True):
+        """
+        Generates the bundle in chunks, without ever keeping the whole bundle
+        in memory. Unminified bundles are created in python, minified ones
+        are passed through r.js.
+
+        All files are processed before the first chunk is generated, so any
+        error is raised before any output was produced.
+        """
+        if minify:
+            yield from self._iter_rjs_bundle(ctx)
+        else:
+            yield from self._iter_native_bundle(ctx)
+
+    def _iter_rjs_bundle(self, ctx):
+        """
+        Generates a minified bundle using r.js. The output of r.js is spooled
+        to a temporary file and only passed on once r.js has finished
+        successfully, so a failed build never yields a partial bundle.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = collections.OrderedDict(_almond=os.path.join(
+                os.path.dirname(__file__), 'almond'))
+            include = ['_almond']
+            for name, path in self._iter_bundle_sources():
+                include.append(name)
+                if not self.js:
+                    continue
+                # rendered files are stored in a temporary folder, so r.js
+                # can read them from disk like all other files
+                paths[name] = os.path.join(tmpdir, name)
+                os.makedirs(os.path.dirname(paths[name]), exist_ok=True)
+                with open(paths[name] + '.js', 'w') as file:
+                    file.write(self._read_bundle_source(ctx, path))
+            conf = _merge_conf({
+                "out": "stdout",
+                "optimize": "uglify",
+                "include": list(sorted(include)),
+            }, self.requirejs_config)
+            conf["baseUrl"] = self.rootdir
+            conf["paths"] = _rjs_paths(
+                paths, include, conf.get("paths", {}))
+            script = r'''
+                require("requirejs").optimize(%s, function (result) {
+                    console.warn(result);
+                }, function(err) {
+                    console.warn(err);
+                    process.exit(1);
+                });
+            ''' % json.dumps(conf)
+            with tempfile.TemporaryFile('w+', encoding='UTF-8') as outfile, \
+                    tempfile.TemporaryFile() as errfile:
+                process = subprocess.Popen(['node'],
+                                           stdin=subprocess.PIPE,
+                                           stdout=outfile,
+                                           stderr=errfile)
+                process.communicate(script.encode('UTF-8'))
+                errfile.seek(0)
+                stderr = str(errfile.read(), 'UTF-8')
+                if process.returncode:
+                    self.log.error(stderr)
+                    try:
+                        raise subprocess.CalledProcessError(
+                            process.returncode, 'node', stderr=stderr)
+                    except TypeError:
+                        # the stderr kwarg is only available in python 3.5
+                        pass
+                    raise subprocess.CalledProcessError(
+                        process.returncode, 'node', output=stderr)
+                if stderr:
+                    self.log.info("r.js output:\n" + stderr)
+                outfile.seek(0)
+                yield from iter(lambda: outfile.read(65536), '')
+        yield self.render_requirejs_config()
+
+    def _iter_bundle_sources(self, *, include_hidden=False):
+        for path in self.traverse(include_hidden=include_hidden):
+            yield re.sub(r'\.js(\..+)?$', '', path), path
+
+    def _read_bundle_source(self, ctx, path):
+        if self.js:
+            return self.js.tpl.renderer.render_file(ctx, path)
+        with open(os.path.join(self.rootdir, path)) as file:
+            return file.read()
+
+    def _iter_native_bundle(self, ctx):
+        """
+        Generates an unminified bundle without invoking r.js: anonymous
+        modules are named in python and concatenated in dependency order.
+
+        Each file is rendered and transformed once and spooled to a temporary
+        folder until the order of all modules is known. Like r.js, this also
+        bundles dependencies, that would otherwise be excluded (i.e. hidden
+        files).
+        """
+        map_ = self.requirejs_config.get('map', {})
+        shim = self.requirejs_config.get('shim', {})
+        with tempfile.TemporaryDirectory() as tmpdir:
+            files = {}
+            dependencies = {}
+            pending = list(self._iter_bundle_sources())
+            queued = set(name for name, path in pending)
+            hidden = None
+            while pending:
+                name, path = pending.pop(0)
+                content, deps = _bundle.transform(
+                    name, self._read_bundle_source(ctx, path), shim.get(name))
+                files[name] = os.path.join(tmpdir, '%d.js' % len(files))
+                with open(files[name], 'w', encoding='UTF-8') as file:
+                    file.write(content)
+                dependencies[name] = [_bundle.resolve(name, dep, map_)
+                                      for dep in deps]
+                for dep in dependencies[name]:
+                    if dep in queued:
+                        continue
+                    if hidden is None:
+                        hidden = dict(self._iter_bundle_sources(
+                            include_hidden=True))
+                    if dep in hidden:
+                        queued.add(dep)
+                        pending.append((dep, hidden[dep]))
+            yield self.render_almondjs()
+            for name in _bundle.sort(dependencies):
+                yield '\n' + _bundle.make_header(name) + '\n'
+                with open(files[name], encoding='UTF-8') as file:
+                    yield from iter(lambda: file.read(65536), '')
+        yield '\n' + self.render_requirejs_config()
 
     def install(self, library, define=None):
         if not define:
@@ -351,17 +509,11 @@ class ConfiguredScoreJslibModule(ConfiguredModule):
     def get_package_json(self, name, version='latest'):
         if isinstance(name, Library):
             name = name.name
-        local = os.path.join(self.cachedir, '%s-%s.meta.json' % (name, version))
-        try:
-            mtime = os.path.getmtime(local)
-            if version != 'latest' or time.time() - mtime < 3600:
-                return json.loads(open(local).read(),
-                                  object_pairs_hook=collections.OrderedDict)
-        except FileNotFoundError:
-            pass
+        return self.metacache.get(name, version)
+
+    def _fetch_package_json(self, name, version):
         meta_url = "http://registry.npmjs.org/%s/%s" % (name, version)
         content = str(urllib.request.urlopen(meta_url).read(), 'UTF-8')
-        open(local, 'w').write(content)
         return json.loads(content, object_pairs_hook=collections.OrderedDict)
 
     def _find_main(self, meta, tarball):
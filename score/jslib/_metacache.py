@@ -0,0 +1,193 @@
+# Copyright © 2015-2018 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+import collections
+import contextlib
+import json
+import sqlite3
+import threading
+import time
+
+
+# The only fields of an npm package document, that are actually accessed by
+# this module. Everything else is discarded before storing the document.
+_FIELDS = ('name', 'version', 'main', 'browser', 'dist',
+           'dependencies', 'peerDependencies')
+
+
+# Access times are only updated, if the stored value is older than this many
+# seconds. Cache hits thus remain a single read in most cases.
+ACCESS_GRANULARITY = 3600
+
+
+def _strip(meta):
+    result = collections.OrderedDict()
+    for field in _FIELDS:
+        if field not in meta:
+            continue
+        if field == 'dist':
+            result[field] = collections.OrderedDict(
+                tarball=meta[field]['tarball'])
+        else:
+            result[field] = meta[field]
+    return result
+
+
+class MetadataCache:
+    """
+    Stores the relevant parts of npm package documents in a single sqlite
+    database file.
+
+    Entries for concrete versions never change on the registry and are thus
+    considered fresh forever. Entries for ``latest`` are fresh for *ttl*
+    seconds, after which they are still returned for another *stale* seconds
+    while a background thread fetches a new version. Once the cache holds
+    more than *maxentries* entries, or more than *maxsize* bytes of package
+    documents, the least recently accessed entries are removed. Access times
+    are tracked with a granularity of :data:`ACCESS_GRANULARITY` seconds.
+    """
+
+    def __init__(self, file, fetch, *, ttl=3600, stale=0, maxentries=None,
+                 maxsize=None):
+        self.file = file
+        self.fetch = fetch
+        self.ttl = ttl
+        self.stale = stale
+        self.maxentries = maxentries
+        self.maxsize = maxsize
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        with self._connect() as connection:
+            columns = [row[1] for row in
+                       connection.execute('PRAGMA table_info(package)')]
+            if columns and 'accessed' not in columns:
+                # cache files created before access times were recorded
+                connection.execute('DROP TABLE package')
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS package (
+                    name TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    fetched REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    meta TEXT NOT NULL,
+                    PRIMARY KEY (name, version)
+                )
+            ''')
+            connection.execute('''
+                CREATE INDEX IF NOT EXISTS package_accessed
+                ON package (accessed)
+            ''')
+
+    @contextlib.contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.file, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def get(self, name, version='latest'):
+        with self._connect() as connection:
+            row = connection.execute(
+                'SELECT fetched, accessed, meta FROM package '
+                'WHERE name = ? AND version = ?', (name, version)).fetchone()
+        if row is not None:
+            fetched, accessed, meta = row
+            now = time.time()
+            if now - accessed > ACCESS_GRANULARITY:
+                self._touch(name, version)
+            age = now - fetched
+            if version != 'latest' or age < self.ttl:
+                return self._load(meta)
+            if age < self.ttl + self.stale:
+                self._refresh_async(name, version)
+                return self._load(meta)
+        return self._refresh(name, version)
+
+    def _load(self, meta):
+        return json.loads(meta, object_pairs_hook=collections.OrderedDict)
+
+    def _refresh(self, name, version):
+        meta = _strip(self.fetch(name, version))
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO package '
+                '(name, version, fetched, accessed, meta) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (name, version, now, now,
+                 json.dumps(meta, ensure_ascii=False)))
+            self._evict(connection)
+        return meta
+
+    def _evict(self, connection):
+        if not self.maxentries and not self.maxsize:
+            return
+        rows = connection.execute(
+            'SELECT rowid, LENGTH(CAST(meta AS BLOB)) FROM package '
+            'ORDER BY accessed DESC')
+        count = size = 0
+        evicted = []
+        for rowid, length in rows:
+            count += 1
+            size += length
+            if (self.maxentries and count > self.maxentries) or \
+                    (self.maxsize and size > self.maxsize):
+                evicted.append((rowid,))
+        connection.executemany('DELETE FROM package WHERE rowid = ?', evicted)
+
+    def _touch(self, name, version):
+        try:
+            with self._connect() as connection:
+                connection.execute(
+                    'UPDATE package SET accessed = ? '
+                    'WHERE name = ? AND version = ?',
+                    (time.time(), name, version))
+        except sqlite3.OperationalError:
+            # the cache file might be read-only, in which case eviction
+            # order is merely less accurate
+            pass
+
+    def _refresh_async(self, name, version):
+        key = (name, version)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._refresh(name, version)
+            except Exception:
+                # the stale entry remains in place and will be refreshed
+                # synchronously once it exceeds the stale window
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
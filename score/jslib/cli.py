@@ -105,13 +105,15 @@ def upgrade(clickctx, library):
 
 @main.command()
 @click.option('-m', '--minify', is_flag=True)
+@click.option('-o', '--output', type=click.Path(dir_okay=False), default='-')
 @click.pass_context
-def bundle(clickctx, minify):
+def bundle(clickctx, minify, output):
     """
     Create a bundle with all files
     """
     score = clickctx.obj['conf'].load()
-    click.echo(score.jslib.make_bundle(minify=minify))
+    with click.open_file(output, 'w', atomic=True) as file:
+        score.jslib.write_bundle(file, minify=minify)
     output_missing_dependencies(score.jslib)
 
 
@@ -0,0 +1,188 @@
+from score.jslib._bundle import transform, resolve, sort
+
+
+def test_anonymous_define():
+    content, deps = transform(
+        'lib/a', "define(['./b', 'jquery'], function (b, $) {});")
+    assert content == \
+        "define(\"lib/a\", ['./b', 'jquery'], function (b, $) {});"
+    assert deps == ['./b', 'jquery']
+
+
+def test_anonymous_define_without_dependencies():
+    content, deps = transform('a', 'define(function () { return 1; });')
+    assert content == 'define("a", function () { return 1; });'
+    assert deps == []
+
+
+def test_object_literal():
+    content, deps = transform('a', 'define({foo: "bar"});')
+    assert content == 'define("a", {foo: "bar"});'
+    assert deps == []
+
+
+def test_named_define():
+    source = "define('a', ['b'], function (b) {});"
+    assert transform('a', source) == (source, ['b'])
+
+
+def test_other_named_define_is_skipped():
+    content, deps = transform(
+        'a', "define('x', [], function () {});\ndefine(['b'], function () {});")
+    assert content == "define('x', [], function () {});\n" \
+        "define(\"a\", ['b'], function () {});"
+    assert deps == ['b']
+
+
+def test_umd():
+    source = (
+        "(function (root, factory) {\n"
+        "    if (typeof define === 'function' && define.amd) {\n"
+        "        define(['exports', 'b'], factory);\n"
+        "    } else if (typeof exports === 'object') {\n"
+        "        factory(exports, require('b'));\n"
+        "    }\n"
+        "}(this, function (exports, b) {}));\n")
+    content, deps = transform('a', source)
+    assert "define(\"a\", ['exports', 'b'], factory);" in content
+    assert deps == ['exports', 'b']
+
+
+def test_commonjs_sugar():
+    content, deps = transform('a', (
+        "define(function (require, exports, module) {\n"
+        "    var b = require('./b');\n"
+        "    // var c = require('c');\n"
+        "    var d = require( \"d\" );\n"
+        "});\n"))
+    assert content.startswith('define("a", function (require')
+    assert deps == ['./b', 'd']
+
+
+def test_requires_outside_factory_are_ignored():
+    content, deps = transform('a', (
+        "define(factory);\n"
+        "function factory(require) { require('b'); }\n"))
+    assert content.startswith('define("a", factory);')
+    assert deps == []
+
+
+def test_requires_in_factory_without_arguments_are_ignored():
+    assert transform('a', "define(function () { require('b'); });")[1] == []
+
+
+def test_dependency_array_with_comments():
+    content, deps = transform('a', (
+        "define([\n"
+        "    'b', // the b module\n"
+        "    /* 'x', */ 'c'\n"
+        "], function (b, c) {});\n"))
+    assert deps == ['b', 'c']
+
+
+def test_non_amd_file():
+    content, deps = transform('a', 'window.a = 1;')
+    assert content == 'window.a = 1;\ndefine("a", function(){});\n'
+    assert deps == []
+
+
+def test_define_in_comment():
+    content, deps = transform(
+        'lib/b', '/* exports define() for AMD */\ndefine(f);')
+    assert content == \
+        '/* exports define() for AMD */\ndefine("lib/b", f);'
+    assert deps == []
+
+
+def test_define_in_line_comment():
+    content, deps = transform('a', '// define(x)\ndefine(f);')
+    assert content == '// define(x)\ndefine("a", f);'
+
+
+def test_define_in_string():
+    content, deps = transform('lib/x', 'var s = "define("; define(["a"], f);')
+    assert content == 'var s = "define("; define("lib/x", ["a"], f);'
+    assert deps == ['a']
+
+
+def test_define_in_template_literal():
+    content, deps = transform('a', 'var s = `define(${x})`; define(f);')
+    assert content == 'var s = `define(${x})`; define("a", f);'
+
+
+def test_define_in_regex_literal():
+    content, deps = transform('a', 'var r = /define\\(["]/g; define(f);')
+    assert content == 'var r = /define\\(["]/g; define("a", f);'
+
+
+def test_division_is_not_a_regex():
+    content, deps = transform('a', 'var x = a / 2, y = b / 3; define(f);')
+    assert content == 'var x = a / 2, y = b / 3; define("a", f);'
+
+
+def test_function_declaration_is_not_a_definition():
+    content, deps = transform('a', 'function define(x) {}')
+    assert content == 'function define(x) {}\ndefine("a", function(){});\n'
+
+
+def test_resolve_absolute():
+    assert resolve('lib/a', 'jquery') == 'jquery'
+
+
+def test_resolve_relative():
+    assert resolve('lib/a', './b') == 'lib/b'
+    assert resolve('lib/sub/a', '../b') == 'lib/b'
+    assert resolve('a', './b') == 'b'
+
+
+def test_resolve_plugin():
+    assert resolve('lib/a', 'text!./tpl.html') == 'text'
+
+
+def test_resolve_map():
+    map_ = {
+        'lib/a': {'jquery': 'vendor/jquery'},
+        '*': {'lodash': 'vendor/lodash'},
+    }
+    assert resolve('lib/a', 'jquery', map_) == 'vendor/jquery'
+    assert resolve('lib/b', 'jquery', map_) == 'jquery'
+    assert resolve('lib/b', 'lodash', map_) == 'vendor/lodash'
+
+
+def test_sort_dependencies_first():
+    assert sort({
+        'a': ['c', 'b'],
+        'b': ['c'],
+        'c': [],
+    }) == ['c', 'b', 'a']
+
+
+def test_sort_ignores_external_dependencies():
+    assert sort({'a': ['jquery', 'exports'], 'b': []}) == ['a', 'b']
+
+
+def test_sort_cycle():
+    result = sort({'a': ['b'], 'b': ['a'], 'c': ['a']})
+    assert result == ['b', 'a', 'c']
+
+
+def test_shim_exports():
+    content, deps = transform(
+        'backbone', 'window.Backbone = {};',
+        {'deps': ['underscore'], 'exports': 'Backbone'})
+    assert content.startswith(
+        'window.Backbone = {};\ndefine("backbone", ["underscore"], ')
+    assert 'return global.Backbone;' in content
+    assert deps == ['underscore']
+
+
+def test_shim_dependency_list():
+    content, deps = transform('plugin', '$.fn.plugin = 1;', ['jquery'])
+    assert content == \
+        '$.fn.plugin = 1;\ndefine("plugin", ["jquery"], function(){});\n'
+    assert deps == ['jquery']
+
+
+def test_shim_is_ignored_for_amd_modules():
+    content, deps = transform('a', 'define(f);', {'exports': 'A'})
+    assert content == 'define("a", f);'
@@ -0,0 +1,200 @@
+import io
+import json
+import os
+import re
+import subprocess
+
+import pytest
+
+from score.jslib import init
+from score.jslib import _init
+from score.jslib._init import _rjs_paths
+
+
+def make_jslib(tmpdir, files):
+    rootdir = tmpdir.mkdir('js')
+    for path, content in files.items():
+        rootdir.join(path).write(content, ensure=True)
+    return init({
+        'rootdir': str(rootdir),
+        'cachedir': str(tmpdir.mkdir('cache')),
+    })
+
+
+def test_native_bundle(tmpdir):
+    jslib = make_jslib(tmpdir, {
+        'app.js': "define(['lib/util'], function (util) {});",
+        'lib/util.js': "define(['./base'], function (base) {});",
+        'lib/base.js': "window.base = 1;",
+        '_hidden.js': "define(function () {});",
+    })
+    bundle = jslib.make_bundle(minify=False)
+    assert bundle.startswith(jslib.render_almondjs())
+    assert bundle.endswith(jslib.render_requirejs_config())
+    base = bundle.index('window.base = 1;\ndefine("lib/base", function(){});')
+    util = bundle.index(
+        "define(\"lib/util\", ['./base'], function (base) {});")
+    app = bundle.index("define(\"app\", ['lib/util'], function (util) {});")
+    assert base < util < app
+    assert '_hidden' not in bundle
+
+
+def test_write_bundle(tmpdir):
+    jslib = make_jslib(tmpdir, {'a.js': 'define(function () {});'})
+    file = io.StringIO()
+    jslib.write_bundle(file, minify=False)
+    assert file.getvalue() == jslib.make_bundle(minify=False)
+
+
+def test_rjs_paths_prefer_local_modules():
+    paths = _rjs_paths(
+        {'_almond': '/pkg/almond', 'app': '/tmp/app'},
+        ['_almond', 'app', 'lib/util'],
+        {
+            'app': '/js/app',
+            'lib': '/js/lib',
+            'jquery': '//cdn/jquery',
+            'lodash': 'https://cdn/lodash',
+            'moment': ['http://cdn/moment', 'vendor/moment'],
+            'd3': 'vendor/d3-4.2',
+        })
+    assert paths == {
+        'jquery': 'empty:',
+        'lodash': 'empty:',
+        'moment': 'empty:',
+        'd3': 'vendor/d3-4.2',
+        '_almond': '/pkg/almond',
+        'app': '/tmp/app',
+    }
+
+
+def test_native_bundle_includes_hidden_dependencies(tmpdir):
+    jslib = make_jslib(tmpdir, {
+        'app.js': "define(['_helper'], function (helper) {});",
+        '_helper.js': "define(['_internal/base'], function (base) {});",
+        '_internal/base.js': "define(function () {});",
+        '_unused.js': "define(function () {});",
+    })
+    bundle = jslib.make_bundle(minify=False)
+    base = bundle.index('define("_internal/base", function () {});')
+    helper = bundle.index(
+        "define(\"_helper\", ['_internal/base'], function (base) {});")
+    app = bundle.index("define(\"app\", ['_helper'], function (helper) {});")
+    assert base < helper < app
+    assert '_unused' not in bundle
+
+
+def test_native_bundle_applies_shim(tmpdir):
+    jslib = make_jslib(tmpdir, {
+        'app.js': "define(['lib'], function (lib) {});",
+        'lib.js': "window.Lib = {dep: window.Dep};",
+        'dep.js': "window.Dep = 1;",
+    })
+    jslib.config_overrides['shim'] = {
+        'lib': {'deps': ['dep'], 'exports': 'Lib'},
+    }
+    bundle = jslib.make_bundle(minify=False)
+    assert bundle.index('window.Dep = 1;') < bundle.index('window.Lib')
+    assert 'define("lib", ["dep"], (function (global) {' in bundle
+
+
+class FakeJs:
+
+    def __init__(self, rootdir, files):
+        self.rootdir = rootdir
+        self.files = files
+        self.tpl = self
+        self.renderer = self
+
+    def paths(self, include_hidden=False):
+        return [path for path in self.files
+                if include_hidden or not path.startswith('_')]
+
+    def virtjs(self, path, hasher=None):
+        return lambda func: func
+
+    def render_file(self, ctx, path):
+        return '/* rendered */ ' + self.files[path]
+
+
+class FakeNode:
+
+    def __init__(self, returncode=0, output='MINIFIED'):
+        self.returncode = returncode
+        self.output = output
+        self.conf = None
+        self.sources = {}
+
+    def __call__(self, args, *, stdin, stdout, stderr):
+        assert args == ['node']
+        self.stdout = stdout
+        self.stderr = stderr
+        return self
+
+    def communicate(self, script):
+        script = str(script, 'UTF-8')
+        match = re.search(r'optimize\((.*), function \(result\)', script,
+                          re.DOTALL)
+        self.conf = json.loads(match.group(1))
+        for name, path in self.conf['paths'].items():
+            if os.path.exists(path + '.js'):
+                with open(path + '.js') as file:
+                    self.sources[name] = file.read()
+        self.stdout.write(self.output)
+        self.stderr.write(b'r.js log')
+
+
+@pytest.fixture
+def node(monkeypatch):
+    node = FakeNode()
+    monkeypatch.setattr(_init.subprocess, 'Popen', node)
+    return node
+
+
+def make_js_jslib(tmpdir, files):
+    rootdir = tmpdir.mkdir('js')
+    return init({
+        'cachedir': str(tmpdir.mkdir('cache')),
+    }, FakeJs(str(rootdir), files))
+
+
+def test_rjs_bundle(tmpdir, node):
+    jslib = make_js_jslib(tmpdir, {
+        'app.js': "define(['lib/util'], function (util) {});",
+        'lib/util.js': "define(function () {});",
+        '_hidden.js': "define(function () {});",
+    })
+    bundle = jslib.make_bundle(minify=True)
+    assert bundle == 'MINIFIED' + jslib.render_requirejs_config()
+    assert 'rawText' not in node.conf
+    assert node.conf['out'] == 'stdout'
+    assert node.conf['optimize'] == 'uglify'
+    assert node.conf['baseUrl'] == jslib.rootdir
+    assert node.conf['include'] == ['_almond', 'app', 'lib/util']
+    assert node.conf['paths']['_almond'] == os.path.join(
+        os.path.dirname(_init.__file__), 'almond')
+    assert set(node.conf['paths']) == {'_almond', 'app', 'lib/util'}
+    assert node.sources == {
+        '_almond': open(os.path.join(
+            os.path.dirname(_init.__file__), 'almond.js')).read(),
+        'app': "/* rendered */ define(['lib/util'], function (util) {});",
+        'lib/util': "/* rendered */ define(function () {});",
+    }
+
+
+def test_rjs_bundle_without_js_reads_rootdir(tmpdir, node):
+    jslib = make_jslib(tmpdir, {'app.js': 'define(function () {});'})
+    jslib.make_bundle(minify=True)
+    assert node.conf['baseUrl'] == jslib.rootdir
+    assert node.conf['include'] == ['_almond', 'app']
+    assert list(node.conf['paths']) == ['_almond']
+
+
+def test_rjs_bundle_failure_yields_nothing(tmpdir, node):
+    node.returncode = 1
+    jslib = make_jslib(tmpdir, {'app.js': 'define(function () {});'})
+    chunks = []
+    with pytest.raises(subprocess.CalledProcessError):
+        for chunk in jslib.iter_bundle(minify=True):
+            chunks.append(chunk)
+    assert chunks == []
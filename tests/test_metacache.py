@@ -0,0 +1,193 @@
+import sqlite3
+import time
+
+import pytest
+
+from score.jslib import _metacache
+from score.jslib._metacache import MetadataCache
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class Registry:
+
+    def __init__(self):
+        self.calls = []
+        self.versions = {}
+
+    def __call__(self, name, version):
+        self.calls.append((name, version))
+        return {
+            'name': name,
+            'version': self.versions.get(name, '1.0.0'),
+            'readme': 'x' * 1000,
+            'dist': {'tarball': 'http://example.com/%s.tgz' % name,
+                     'shasum': 'abc'},
+        }
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(_metacache, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+@pytest.fixture
+def make_cache(tmpdir, registry, clock):
+    def make_cache(**kwargs):
+        return MetadataCache(str(tmpdir.join('meta.sqlite3')), registry,
+                             **kwargs)
+    return make_cache
+
+
+def wait_for(predicate, timeout=5):
+    end = time.time() + timeout
+    while not predicate():
+        assert time.time() < end, 'timeout'
+        time.sleep(0.01)
+
+
+def test_strips_unused_fields(make_cache):
+    meta = make_cache().get('@scope/pkg')
+    assert meta == {
+        'name': '@scope/pkg',
+        'version': '1.0.0',
+        'dist': {'tarball': 'http://example.com/@scope/pkg.tgz'},
+    }
+
+
+def test_versions_never_expire(make_cache, registry, clock):
+    cache = make_cache(ttl=10)
+    cache.get('pkg', '1.0.0')
+    clock.now += 100000
+    cache.get('pkg', '1.0.0')
+    assert registry.calls == [('pkg', '1.0.0')]
+
+
+def test_latest_expires_after_ttl(make_cache, registry, clock):
+    cache = make_cache(ttl=10)
+    cache.get('pkg')
+    clock.now += 5
+    cache.get('pkg')
+    assert len(registry.calls) == 1
+    registry.versions['pkg'] = '2.0.0'
+    clock.now += 10
+    assert cache.get('pkg')['version'] == '2.0.0'
+    assert len(registry.calls) == 2
+
+
+def test_stale_while_revalidate(make_cache, registry, clock):
+    cache = make_cache(ttl=10, stale=100)
+    cache.get('pkg')
+    registry.versions['pkg'] = '2.0.0'
+    clock.now += 50
+    assert cache.get('pkg')['version'] == '1.0.0'
+    wait_for(lambda: len(registry.calls) == 2)
+    wait_for(lambda: cache.get('pkg')['version'] == '2.0.0')
+    assert len(registry.calls) == 2
+
+
+def test_stale_window_exceeded(make_cache, registry, clock):
+    cache = make_cache(ttl=10, stale=100)
+    cache.get('pkg')
+    registry.versions['pkg'] = '2.0.0'
+    clock.now += 200
+    assert cache.get('pkg')['version'] == '2.0.0'
+
+
+def test_evicts_least_recently_used_entries(make_cache, registry, clock):
+    cache = make_cache(maxentries=2)
+    cache.get('a', '1.0.0')
+    clock.now += _metacache.ACCESS_GRANULARITY + 1
+    cache.get('b', '1.0.0')
+    clock.now += _metacache.ACCESS_GRANULARITY + 1
+    cache.get('a', '1.0.0')
+    clock.now += 1
+    cache.get('c', '1.0.0')
+    del registry.calls[:]
+    cache.get('a', '1.0.0')
+    cache.get('c', '1.0.0')
+    assert registry.calls == []
+    cache.get('b', '1.0.0')
+    assert registry.calls == [('b', '1.0.0')]
+
+
+def test_access_time_granularity(make_cache, tmpdir, clock):
+    cache = make_cache()
+    cache.get('a', '1.0.0')
+
+    def accessed():
+        connection = sqlite3.connect(str(tmpdir.join('meta.sqlite3')))
+        try:
+            return connection.execute(
+                'SELECT accessed FROM package').fetchone()[0]
+        finally:
+            connection.close()
+
+    start = clock.now
+    clock.now += _metacache.ACCESS_GRANULARITY
+    cache.get('a', '1.0.0')
+    assert accessed() == start
+    clock.now += 1
+    cache.get('a', '1.0.0')
+    assert accessed() == clock.now
+
+
+def test_read_only_cache(make_cache, registry, tmpdir, clock, monkeypatch):
+    cache = make_cache()
+    cache.get('a', '1.0.0')
+    file = str(tmpdir.join('meta.sqlite3'))
+    connect = sqlite3.connect
+    monkeypatch.setattr(
+        _metacache.sqlite3, 'connect',
+        lambda *args, **kwargs: connect(
+            'file:%s?mode=ro' % file, uri=True, **kwargs))
+    cache = make_cache()
+    clock.now += _metacache.ACCESS_GRANULARITY + 1
+    assert cache.get('a', '1.0.0')['version'] == '1.0.0'
+    assert registry.calls == [('a', '1.0.0')]
+
+
+def test_evicts_by_size(make_cache, registry, clock):
+    size = len(_metacache.json.dumps(
+        _metacache._strip(registry('a', '1.0.0'))))
+    cache = make_cache(maxsize=size * 2 + 1)
+    for name in ('a', 'b', 'c'):
+        cache.get(name, '1.0.0')
+        clock.now += 1
+    del registry.calls[:]
+    cache.get('b', '1.0.0')
+    cache.get('c', '1.0.0')
+    assert registry.calls == []
+    cache.get('a', '1.0.0')
+    assert registry.calls == [('a', '1.0.0')]
+
+
+def test_size_is_measured_in_bytes(make_cache, registry, clock):
+    # 177 characters, but 277 bytes in UTF-8
+    registry.versions['a'] = '\u00e4' * 100
+    cache = make_cache(maxsize=200)
+    cache.get('a', '1.0.0')
+    cache.get('a', '1.0.0')
+    assert len(registry.calls) == 2
+
+
+def test_init_does_not_create_cache(tmpdir):
+    from score.jslib import init
+    cachedir = tmpdir.mkdir('cache')
+    rootdir = tmpdir.mkdir('js')
+    init({'cachedir': str(cachedir), 'rootdir': str(rootdir)})
+    assert cachedir.listdir() == []